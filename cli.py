@@ -4,6 +4,8 @@ import requests
 import os
 import sys
 import logging
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,10 +15,23 @@ logger = logging.getLogger(__name__)
 
 
 API_BASE = "http://localhost:8000/dataset"
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
+# Shared session so consecutive calls reuse pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+
+def _save_stream(resp, output_file):
+    """Write a streamed response body to disk chunk by chunk"""
+    with open(output_file, "wb") as f:
+        for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            f.write(chunk)
 
 
 def list_datasets():
-    resp = requests.get(f"{API_BASE}/datasets/")
+    resp = SESSION.get(f"{API_BASE}/datasets/")
     resp.raise_for_status()
     datasets = resp.json().get("datasets", [])
     if not datasets:
@@ -31,15 +46,20 @@ def upload_dataset(file_path):
         logger.info(f"File {file_path} does not exist.")
         return
     with open(file_path, "rb") as f:
-        files = {"file": (os.path.basename(file_path), f)}
-        resp = requests.post(f"{API_BASE}/datasets/", files=files)
+        # Stream the file off disk instead of building the whole multipart body in memory
+        encoder = MultipartEncoder(fields={"file": (os.path.basename(file_path), f, "text/csv")})
+        resp = SESSION.post(
+            f"{API_BASE}/datasets/",
+            data=encoder,
+            headers={"Content-Type": encoder.content_type},
+        )
         resp.raise_for_status()
         result = resp.json()
         logger.info(f"Dataset created: {result['dataset']['filename']} (id: {result['id']})")
 
 
 def get_dataset(dataset_id):
-    resp = requests.get(f"{API_BASE}/datasets/{dataset_id}/")
+    resp = SESSION.get(f"{API_BASE}/datasets/{dataset_id}/")
     if resp.status_code == 404:
         logger.info("Dataset not found.")
         return
@@ -49,7 +69,7 @@ def get_dataset(dataset_id):
 
 
 def delete_dataset(dataset_id):
-    resp = requests.delete(f"{API_BASE}/datasets/{dataset_id}/")
+    resp = SESSION.delete(f"{API_BASE}/datasets/{dataset_id}/")
     if resp.status_code == 404:
         logger.info("Dataset not found.")
         return
@@ -58,24 +78,22 @@ def delete_dataset(dataset_id):
 
 
 def export_excel(dataset_id, output_file):
-    resp = requests.get(f"{API_BASE}/datasets/{dataset_id}/excel/")
-    if resp.status_code == 404:
-        logger.info("Dataset not found.")
-        return
-    resp.raise_for_status()
-    with open(output_file, "wb") as f:
-        f.write(resp.content)
+    with SESSION.get(f"{API_BASE}/datasets/{dataset_id}/excel/", stream=True) as resp:
+        if resp.status_code == 404:
+            logger.info("Dataset not found.")
+            return
+        resp.raise_for_status()
+        _save_stream(resp, output_file)
     logger.info(f"Excel file saved to {output_file}")
 
 
 def generate_plot(dataset_id, output_file):
-    resp = requests.get(f"{API_BASE}/datasets/{dataset_id}/plot/")
-    if resp.status_code == 404:
-        logger.info("Dataset not found.")
-        return
-    resp.raise_for_status()
-    with open(output_file, "wb") as f:
-        f.write(resp.content)
+    with SESSION.get(f"{API_BASE}/datasets/{dataset_id}/plot/", stream=True) as resp:
+        if resp.status_code == 404:
+            logger.info("Dataset not found.")
+            return
+        resp.raise_for_status()
+        _save_stream(resp, output_file)
     logger.info(f"Plot PDF saved to {output_file}")
 
 
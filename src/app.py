@@ -1,16 +1,24 @@
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from routes import dataset_routes
 from config.settings import settings
+from utils.middleware import UploadSizeLimitMiddleware
 
 
 app = FastAPI(
     title="CSV dataset processor",
     description="API REST for dataset processing",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Reject oversized uploads while the body is being received. Added first so it sits
+# inside the CORS middleware, which then adds its headers to the 413 response too
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.MAX_UPLOAD_BYTES)
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -20,6 +28,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress responses (stats JSON, exports) for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 app.include_router(dataset_routes.dataset_router, tags=["csv_dataset"], prefix="/dataset")
 
 @app.get("/")
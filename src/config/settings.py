@@ -4,5 +4,6 @@ from pydantic import BaseSettings, Field
 class Settings(BaseSettings):
     HOST: str = Field(description="the host of the application", env="HOST", default="localhost")
     PORT: str = Field(description="the port of the application", env="PORT", default="8000")
+    MAX_UPLOAD_BYTES: int = Field(description="the maximum size of an uploaded CSV file", env="MAX_UPLOAD_BYTES", default=1 << 30)
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,8 @@
+from functools import lru_cache
+from services.dataset import DatasetManager
+
+
+@lru_cache()
+def get_manager() -> DatasetManager:
+    """Return the DatasetManager shared by every request"""
+    return DatasetManager()
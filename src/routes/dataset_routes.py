@@ -1,50 +1,236 @@
+import os
 import re
+import asyncio
+import concurrent.futures
+import multiprocessing
+from concurrent.futures.process import BrokenProcessPool
 import io
+import tempfile
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
-from fastapi import APIRouter, HTTPException, Response, UploadFile, File
-from typing import List
-from services.dataset import DatasetManager
-from utils.helpers import allowed_file
+from joblib import Parallel, delayed
+from fastapi import APIRouter, Depends, HTTPException, Response, UploadFile, File
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+from typing import List, Optional
+from deps import get_manager
+from services.dataset import Dataset, DatasetManager
+from utils.helpers import allowed_content_type, allowed_file
 
 dataset_router = APIRouter()
-dataset_manager = DatasetManager()
+
+# CPU-bound pandas/matplotlib work runs here so it does not block the event loop
+_process_pool: Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> concurrent.futures.ProcessPoolExecutor:
+    """
+    Create the process pool on first use, so worker processes importing this module
+    do not build pools of their own. Workers are started from a forkserver, since
+    forking the threaded server could copy locks held by other threads. A pool left
+    broken by a dead worker is replaced.
+    """
+    global _process_pool
+    if _process_pool is not None and _process_pool._broken:
+        _discard_process_pool(_process_pool)
+    if _process_pool is None:
+        _process_pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _process_pool
+
+
+def _discard_process_pool(pool: concurrent.futures.ProcessPoolExecutor):
+    """Shut down a broken pool so the next call to _get_process_pool starts a fresh one"""
+    global _process_pool
+    pool.shutdown(wait=False, cancel_futures=True)
+    if _process_pool is pool:
+        _process_pool = None
+
+
+async def _run_in_process_pool(func, *args):
+    """
+    Run func in the process pool. If a worker died (e.g. killed for running out of
+    memory) the pool is unusable, so it is discarded before the error propagates.
+    """
+    pool = _get_process_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        _discard_process_pool(pool)
+        raise
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+EXCEL_CHUNK_ROWS = 10_000
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_MAX_COLS = 16_384
+HIST_BINS = 30
+# Histogram threads per pool worker, capped since every worker may be plotting at once
+HIST_JOBS = min(4, os.cpu_count() or 1)
+PLOT_DPI = 100
+LARGE_DATASET_ROWS = 1_000_000
+_SAFE_NAME = re.compile(r"[^\w\-_. ]")
+
+
+def _write_excel(dataset: Dataset, path: str):
+    """
+    Write a dataset to an .xlsx file row by row. Rows are read from the Parquet
+    file one batch at a time, and in constant_memory mode xlsxwriter flushes each
+    row to disk, so rows must be written in order.
+    """
+    workbook = xlsxwriter.Workbook(
+        path,
+        {"constant_memory": True, "default_date_format": "yyyy-mm-dd hh:mm:ss", "remove_timezone": True},
+    )
+    worksheet = workbook.add_worksheet("Data")
+    with pq.ParquetFile(dataset.data_path, memory_map=True) as parquet_file:
+        worksheet.write_row(0, 0, parquet_file.schema_arrow.names)
+        row_idx = 1
+        for batch in parquet_file.iter_batches(batch_size=EXCEL_CHUNK_ROWS):
+            chunk = batch.to_pandas()
+            # Missing values become blank cells and infinities the strings pandas' inf_rep used
+            chunk = chunk.astype(object).where(chunk.notna(), None).replace({np.inf: "inf", -np.inf: "-inf"})
+            for row in chunk.itertuples(index=False, name=None):
+                if worksheet.write_row(row_idx, 0, row) != 0:
+                    workbook.close()
+                    raise ValueError(f"Failed to write row {row_idx} to the Excel sheet")
+                row_idx += 1
+    workbook.close()
+
+
+def _histogram(series: pd.Series):
+    """Compute histogram counts and bin edges for a column, ignoring missing values"""
+    return np.histogram(series.dropna().to_numpy(), bins=HIST_BINS)
+
+
+def _streamed_histograms(parquet_file: pq.ParquetFile, columns: List[str]):
+    """
+    Bin columns batch by batch straight from the Parquet file, taking each bin
+    range from the row group min/max statistics, so no column is loaded whole.
+    """
+    metadata = parquet_file.metadata
+    ranges = []
+    for col in columns:
+        idx = parquet_file.schema_arrow.get_field_index(col)
+        lows, highs = [], []
+        for rg in range(metadata.num_row_groups):
+            stats = metadata.row_group(rg).column(idx).statistics
+            if stats is not None and stats.has_min_max:
+                lows.append(stats.min)
+                highs.append(stats.max)
+        ranges.append((min(lows), max(highs)) if lows else (0.0, 1.0))
+
+    counts = [np.zeros(HIST_BINS, dtype=np.int64) for _ in columns]
+    for batch in parquet_file.iter_batches(columns=columns):
+        for i, column in enumerate(batch.columns):
+            values = column.drop_null().to_numpy()
+            counts[i] += np.histogram(values, bins=HIST_BINS, range=ranges[i])[0]
+
+    return [
+        (col_counts, np.histogram_bin_edges([], bins=HIST_BINS, range=value_range))
+        for col_counts, value_range in zip(counts, ranges)
+    ]
+
+
+def _render_plot(dataset: Dataset) -> Optional[bytes]:
+    """Render histograms of the numeric columns to a PDF, or return None if there are none"""
+    # Only the numeric columns are read, string columns never leave the disk
+    numerical_cols = dataset.get_numeric_columns()
+    if not numerical_cols:
+        return None
+
+    with pq.ParquetFile(dataset.data_path, memory_map=True) as parquet_file:
+        if parquet_file.metadata.num_rows > LARGE_DATASET_ROWS:
+            histograms = _streamed_histograms(parquet_file, numerical_cols)
+        else:
+            df = dataset.get_dataframe(columns=numerical_cols, cache=False)
+            # np.histogram releases the GIL, so columns can be binned in parallel threads
+            histograms = Parallel(n_jobs=HIST_JOBS, prefer="threads")(
+                delayed(_histogram)(df[col]) for col in numerical_cols
+            )
+
+    output = io.BytesIO()
+    with PdfPages(output) as pdf:
+        n_cols = min(3, len(numerical_cols))
+        n_rows = (len(numerical_cols) + n_cols - 1) // n_cols
+
+        fig, axes = plt.subplots(
+            n_rows, n_cols, figsize=(5 * n_cols, 5 * n_rows), constrained_layout=True
+        )
+        axes = axes.flatten() if len(numerical_cols) > 1 else [axes]
+
+        for i, (col, (counts, edges)) in enumerate(zip(numerical_cols, histograms)):
+            ax = axes[i]
+            # Bars below zorder 1 are rasterized, keeping the PDF small for many bins
+            ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', alpha=0.7, zorder=0)
+            ax.set_rasterization_zorder(1)
+            ax.set_title(f'Histogram of {col}')
+            ax.set_xlabel(col)
+            ax.set_ylabel('Frequency')
+            ax.grid(True, alpha=0.3)
+
+        for j in range(len(numerical_cols), len(axes)):
+            axes[j].set_visible(False)
+
+        pdf.savefig(fig, dpi=PLOT_DPI)
+        plt.close(fig)
+
+    return output.getvalue()
+
+
+@dataset_router.on_event("shutdown")
+def shutdown_process_pool():
+    """Stop the worker processes when the application shuts down"""
+    if _process_pool is not None:
+        _process_pool.shutdown()
 
 
 @dataset_router.get("/datasets/", status_code=200)
-async def list_datasets():
+async def list_datasets(dataset_manager: DatasetManager = Depends(get_manager)):
     """List all uploaded datasets"""
     try:
-        datasets = dataset_manager.list_datasets()
+        datasets = await asyncio.to_thread(dataset_manager.list_datasets)
         return {"datasets": [dataset.to_dict() for dataset in datasets]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list datasets: {str(e)}")
 
 
 @dataset_router.post("/datasets/", status_code=201)
-async def create_dataset(file: UploadFile = File(...)):
+async def create_dataset(file: UploadFile = File(...), dataset_manager: DatasetManager = Depends(get_manager)):
     """Create a dataset from a CSV file"""
     try:
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file uploaded")
         if not allowed_file(file.filename):
             raise HTTPException(status_code=400, detail="Only CSV files are accepted")
+        if not allowed_content_type(file.content_type):
+            raise HTTPException(status_code=400, detail=f"Unsupported content type: {file.content_type}")
 
-        content = await file.read()
-        file_size = len(content)
+        file_size = 0
+        with tempfile.NamedTemporaryFile(suffix=".csv", delete=False) as tmp:
+            csv_path = tmp.name
         try:
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid CSV file: {str(e)}")
-
-        dataset = dataset_manager.create_dataset(
-            original_filename=file.filename,
-            file_size=file_size,
-            df=df
-        )
+            # Spool the upload to disk chunk by chunk; its size is already capped by the middleware
+            with open(csv_path, "wb") as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    f.write(chunk)
+
+            dataset = dataset_manager.new_dataset(original_filename=file.filename, file_size=file_size)
+            try:
+                await _run_in_process_pool(dataset.save_csv, csv_path)
+            except pa.ArrowInvalid as e:
+                raise HTTPException(status_code=400, detail=f"Invalid CSV file: {str(e)}")
+        finally:
+            os.remove(csv_path)
+        await asyncio.to_thread(dataset_manager.add_dataset, dataset)
 
         return {
             "id": dataset.id,
@@ -52,90 +238,97 @@ async def create_dataset(file: UploadFile = File(...)):
             "dataset": dataset.to_dict()
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create dataset: {str(e)}")
 
 
 @dataset_router.get("/datasets/{dataset_id}/", status_code=200)
-async def get_dataset(dataset_id: str):
+async def get_dataset(dataset_id: str, dataset_manager: DatasetManager = Depends(get_manager)):
     """Retrieve a specific dataset"""
     try:
-        dataset = dataset_manager.get_dataset(dataset_id)
+        dataset = await asyncio.to_thread(dataset_manager.get_dataset, dataset_id)
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset not found")
         return dataset.to_summary_dict()
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve dataset: {str(e)}")
 
 
 @dataset_router.delete("/datasets/{dataset_id}/", status_code=200)
-async def delete_dataset(dataset_id: str):
+async def delete_dataset(dataset_id: str, dataset_manager: DatasetManager = Depends(get_manager)):
     """Delete a dataset"""
     try:
-        dataset = dataset_manager.get_dataset(dataset_id)
-        print(dataset.to_dict())
-        if not dataset:
+        if not await asyncio.to_thread(dataset_manager.delete_dataset, dataset_id):
             raise HTTPException(status_code=404, detail="Dataset not found")
 
-        success = dataset_manager.delete_dataset(dataset_id)
-        if not success:
-            raise HTTPException(status_code=500, detail="Error deleting dataset")
-
         return {"message": "Dataset deleted successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete dataset: {str(e)}")
 
 
 @dataset_router.get("/datasets/{dataset_id}/excel/", status_code=200)
-async def export_excel(dataset_id: str):
+async def export_excel(dataset_id: str, dataset_manager: DatasetManager = Depends(get_manager)):
     """Export dataset as Excel"""
     try:
-        dataset = dataset_manager.get_dataset(dataset_id)
+        dataset = await asyncio.to_thread(dataset_manager.get_dataset, dataset_id)
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset not found")
 
-        df = dataset.get_dataframe()
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Data')
+        n_rows, n_cols = await asyncio.to_thread(dataset.get_shape)
+        if n_rows + 1 > EXCEL_MAX_ROWS or n_cols > EXCEL_MAX_COLS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Dataset is too large for Excel: {n_rows} rows and {n_cols} columns, "
+                       f"the limit is {EXCEL_MAX_ROWS - 1} rows and {EXCEL_MAX_COLS} columns",
+            )
 
-        output.seek(0)
-        excel_filename = re.sub(r"[^\w\-_. ]", "_", dataset.filename.rsplit(".", 1)[0]) + ".xlsx"
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as tmp:
+            excel_path = tmp.name
+        try:
+            await _run_in_process_pool(_write_excel, dataset, excel_path)
+        except Exception:
+            os.remove(excel_path)
+            raise
 
-        return Response(
-            content=output.getvalue(),
+        excel_filename = _SAFE_NAME.sub("_", dataset.filename.rsplit(".", 1)[0]) + ".xlsx"
+
+        return FileResponse(
+            excel_path,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={"Content-Disposition": f"attachment; filename={excel_filename}"},
+            background=BackgroundTask(os.remove, excel_path),
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to export Excel: {str(e)}")
 
 
 @dataset_router.get("/datasets/{dataset_id}/stats/", status_code=200)
-async def get_stats(dataset_id: str):
+async def get_stats(dataset_id: str, dataset_manager: DatasetManager = Depends(get_manager)):
     """Return statistics of a dataset"""
     try:
-        dataset = dataset_manager.get_dataset(dataset_id)
+        dataset = await asyncio.to_thread(dataset_manager.get_dataset, dataset_id)
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset not found")
 
         df = dataset.get_dataframe()
         stats = df.describe(include='all')
-        stats_dict = {
-            col: {idx: (None if pd.isna(stats.loc[idx, col]) 
-                        else stats.loc[idx, col].item() if hasattr(stats.loc[idx, col], 'item') 
-                        else stats.loc[idx, col])
-                  for idx in stats.index}
-            for col in stats.columns
-        }
+        stats_dict = stats.astype(object).where(stats.notna(), None).to_dict()
 
         additional_info = {
             "shape": list(df.shape),
             "columns": list(df.columns),
-            "dtypes": {col: str(dtype) for col, dtype in df.dtypes.items()},
-            "null_counts": {col: int(count) for col, count in df.isnull().sum().items()},
-            "memory_usage": {col: int(usage) for col, usage in df.memory_usage(deep=True).items()}
+            "dtypes": df.dtypes.astype(str).to_dict(),
+            "null_counts": df.isnull().sum().astype(int).to_dict(),
+            "memory_usage": df.memory_usage(deep=True).astype(int).to_dict()
         }
 
         return {"describe": stats_dict, "additional_info": additional_info}
@@ -147,49 +340,26 @@ async def get_stats(dataset_id: str):
 
 
 @dataset_router.get("/datasets/{dataset_id}/plot/", status_code=200)
-async def generate_plot(dataset_id: str):
+async def generate_plot(dataset_id: str, dataset_manager: DatasetManager = Depends(get_manager)):
     """Generate a PDF with histograms for numeric columns"""
     try:
-        dataset = dataset_manager.get_dataset(dataset_id)
+        dataset = await asyncio.to_thread(dataset_manager.get_dataset, dataset_id)
         if not dataset:
             raise HTTPException(status_code=404, detail="Dataset not found")
 
-        df = dataset.get_dataframe()
-        numerical_cols = df.select_dtypes(include=["int64", "float64"]).columns.tolist()
-        if not numerical_cols:
+        content = await _run_in_process_pool(_render_plot, dataset)
+        if content is None:
             raise HTTPException(status_code=400, detail="No numeric columns found in dataset")
 
-        output = io.BytesIO()
-        with PdfPages(output) as pdf:
-            n_cols = min(3, len(numerical_cols))
-            n_rows = (len(numerical_cols) + n_cols - 1) // n_cols
-
-            fig, axes = plt.subplots(n_rows, n_cols, figsize=(5 * n_cols, 5 * n_rows))
-            axes = axes.flatten() if len(numerical_cols) > 1 else [axes]
-
-            for i, col in enumerate(numerical_cols):
-                ax = axes[i]
-                df[col].hist(bins=30, ax=ax, alpha=0.7)
-                ax.set_title(f'Histogram of {col}')
-                ax.set_xlabel(col)
-                ax.set_ylabel('Frequency')
-                ax.grid(True, alpha=0.3)
-
-            for j in range(len(numerical_cols), len(axes)):
-                axes[j].set_visible(False)
-
-            plt.tight_layout()
-            pdf.savefig(fig, bbox_inches='tight')
-            plt.close(fig)
-
-        output.seek(0)
-        plot_filename = re.sub(r"[^\w\-_. ]", "_", dataset.filename.rsplit(".", 1)[0]) + "_plots.pdf"
+        plot_filename = _SAFE_NAME.sub("_", dataset.filename.rsplit(".", 1)[0]) + "_plots.pdf"
 
         return Response(
-            content=output.getvalue(),
+            content=content,
             media_type="application/pdf",
             headers={"Content-Disposition": f"attachment; filename={plot_filename}"},
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate plots: {str(e)}")
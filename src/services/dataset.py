@@ -1,11 +1,18 @@
 import os
-import json
+import re
 import uuid
-import pickle
 import logging
+import sqlite3
+import threading
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
 logging.basicConfig(
@@ -14,6 +21,122 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+CSV_BLOCK_SIZE = 1 << 20
+PARQUET_COMPRESSION = "zstd"
+DATAFRAME_CACHE_SIZE = 8
+CATEGORY_MAX_UNIQUE = 50_000
+
+# Recently loaded DataFrames keyed by (path, mtime, columns); shared between requests, so treat as read-only
+_dataframe_cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_dataframe_cache_lock = threading.Lock()
+
+
+def _load_dataframe(path: str, columns: Optional[List[str]] = None, cache: bool = True) -> pd.DataFrame:
+    """Read a Parquet file, reusing the cached DataFrame while the file is unchanged."""
+    if not cache:
+        return pq.read_table(path, columns=columns, memory_map=True).to_pandas(self_destruct=True)
+
+    key = (path, os.path.getmtime(path), tuple(columns) if columns is not None else None)
+    with _dataframe_cache_lock:
+        if key in _dataframe_cache:
+            _dataframe_cache.move_to_end(key)
+            return _dataframe_cache[key]
+
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    df = table.to_pandas(self_destruct=True)
+
+    with _dataframe_cache_lock:
+        _dataframe_cache[key] = df
+        while len(_dataframe_cache) > DATAFRAME_CACHE_SIZE:
+            _dataframe_cache.popitem(last=False)
+    return df
+
+
+def _evict_dataframe(path: str):
+    """Drop every cached DataFrame loaded from the given path."""
+    with _dataframe_cache_lock:
+        for key in [key for key in _dataframe_cache if key[0] == path]:
+            del _dataframe_cache[key]
+
+
+_CSV_COLUMN_ERROR = re.compile(r"In CSV column #(\d+)")
+
+
+def _wider_type(data_type: pa.DataType) -> Optional[pa.DataType]:
+    """
+    Return the next type to try for a CSV column whose later values did not fit
+    the type inferred from the first block, mirroring pandas: null -> int64 ->
+    float64 -> string. Returns None when the column is already a string.
+    """
+    if pa.types.is_null(data_type):
+        return pa.int64()
+    if pa.types.is_integer(data_type):
+        return pa.float64()
+    if pa.types.is_string(data_type):
+        return None
+    return pa.string()
+
+
+class _DowncastPlanner:
+    """
+    Tracks column values while CSV batches stream past, to pick the narrowest
+    type that holds every value: int8/16/32 for integers, float32 for floats
+    that survive the round trip exactly, and dictionary (category) for strings with
+    fewer unique values than half the rows.
+    """
+
+    def __init__(self, schema: pa.Schema):
+        self.schema = schema
+        self.num_rows = 0
+        self.int_ranges = {}
+        self.float32_safe = {}
+        # Unique values per string column, None once past CATEGORY_MAX_UNIQUE
+        self.uniques = {}
+
+    def update(self, batch: pa.RecordBatch):
+        """Fold a batch into the per-column statistics."""
+        self.num_rows += batch.num_rows
+        for i, field in enumerate(self.schema):
+            column = batch.column(i)
+            if pa.types.is_integer(field.type):
+                bounds = pc.min_max(column)
+                low, high = bounds["min"].as_py(), bounds["max"].as_py()
+                if low is None:
+                    continue
+                if i in self.int_ranges:
+                    low, high = min(low, self.int_ranges[i][0]), max(high, self.int_ranges[i][1])
+                self.int_ranges[i] = (low, high)
+            elif pa.types.is_float64(field.type):
+                if self.float32_safe.get(i, True):
+                    roundtrip = pc.cast(pc.cast(column, pa.float32(), safe=False), pa.float64())
+                    error = pc.max(pc.abs(pc.subtract(roundtrip, column))).as_py()
+                    # The Parquet file is the only copy of the data, so any rounding would be permanent
+                    self.float32_safe[i] = error is None or error == 0
+            elif pa.types.is_string(field.type):
+                seen = self.uniques.get(i, set())
+                if seen is not None:
+                    seen.update(pc.unique(column).drop_null().to_pylist())
+                    self.uniques[i] = seen if len(seen) <= CATEGORY_MAX_UNIQUE else None
+
+    def target_schema(self) -> pa.Schema:
+        """Return the schema with every column narrowed as far as its values allow."""
+        fields = []
+        for i, field in enumerate(self.schema):
+            new_type = field.type
+            if i in self.int_ranges:
+                low, high = self.int_ranges[i]
+                for candidate in (pa.int8(), pa.int16(), pa.int32()):
+                    limits = np.iinfo(candidate.to_pandas_dtype())
+                    if candidate.bit_width < field.type.bit_width and limits.min <= low and high <= limits.max:
+                        new_type = candidate
+                        break
+            elif self.float32_safe.get(i):
+                new_type = pa.float32()
+            elif self.uniques.get(i) is not None and len(self.uniques[i]) < self.num_rows // 2:
+                new_type = pa.dictionary(pa.int32(), pa.string())
+            fields.append(field.with_type(new_type))
+        return pa.schema(fields)
+
 
 class Dataset:
     """
@@ -69,28 +192,94 @@ class Dataset:
             data_path=data.get("data_path"),
         )
 
-    def get_dataframe(self) -> pd.DataFrame:
-        """Store files in locally"""
+    def get_dataframe(self, columns: Optional[List[str]] = None, cache: bool = True) -> pd.DataFrame:
+        """
+        Load the stored DataFrame from disk, optionally only the given columns.
+        Pass cache=False from worker processes, whose caches would never be evicted.
+        """
         try:
-            with open(self.data_path, 'rb') as f:
-                return pickle.load(f)
+            return _load_dataframe(self.data_path, columns, cache)
         except Exception as e:
             raise Exception(f"Error while reading dataframe: {str(e)}")
     
-    def save_dataframe(self, df: pd.DataFrame):
-        """Save a pandas DataFrame to disk."""
+    def get_shape(self) -> Tuple[int, int]:
+        """Return the (rows, columns) of the stored DataFrame, read from the Parquet footer only."""
+        metadata = pq.read_metadata(self.data_path, memory_map=True)
+        return metadata.num_rows, metadata.num_columns
+
+    def get_numeric_columns(self) -> List[str]:
+        """Return the names of the integer and float columns, read from the Parquet schema only."""
+        schema = pq.read_schema(self.data_path, memory_map=True)
+        return [
+            field.name for field in schema
+            if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)
+        ]
+
+    def save_csv(self, csv_path: str):
+        """
+        Convert a CSV file to Parquet batch by batch, so only one
+        block of rows is held in memory at a time. Numeric and string
+        columns are then downcast to the narrowest type that fits.
+        """
+        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        column_types = {}
         try:
-            os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
-            with open(self.data_path, "wb") as f:
-                pickle.dump(df, f)
-            logger.info(f"DataFrame saved successfully at {self.data_path}")
+            while True:
+                convert_options = pacsv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+                reader = pacsv.open_csv(
+                    csv_path,
+                    read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+                    convert_options=convert_options,
+                )
+                planner = _DowncastPlanner(reader.schema)
+                try:
+                    with pq.ParquetWriter(
+                        self.data_path, reader.schema, compression=PARQUET_COMPRESSION, use_dictionary=True
+                    ) as writer:
+                        for batch in reader:
+                            planner.update(batch)
+                            writer.write_batch(batch)
+                    break
+                except pa.ArrowInvalid as e:
+                    # Column types come from the first block; widen the column that
+                    # failed on a later block and convert the file again
+                    match = _CSV_COLUMN_ERROR.search(str(e))
+                    if not match:
+                        raise
+                    field = reader.schema.field(int(match.group(1)))
+                    wider = _wider_type(field.type)
+                    if wider is None:
+                        raise
+                    logger.info(f"Column {field.name} does not fit {field.type}, retrying as {wider}")
+                    column_types[field.name] = wider
+
+            schema = planner.target_schema()
+            if not schema.equals(reader.schema):
+                self._rewrite_parquet(schema)
+            logger.info(f"CSV converted successfully to {self.data_path}")
         except Exception as e:
-            logger.error(f"Failed to save DataFrame for dataset {self.id}: {e}")
+            logger.error(f"Failed to convert CSV for dataset {self.id}: {e}")
+            self.delete_files()
             raise
 
+    def _rewrite_parquet(self, schema: pa.Schema):
+        """Rewrite the Parquet file batch by batch with its columns cast to the given schema."""
+        tmp_path = f"{self.data_path}.tmp"
+        try:
+            with pq.ParquetFile(self.data_path, memory_map=True) as parquet_file, pq.ParquetWriter(
+                tmp_path, schema, compression=PARQUET_COMPRESSION, use_dictionary=True
+            ) as writer:
+                for batch in parquet_file.iter_batches():
+                    writer.write_table(pa.Table.from_batches([batch]).cast(schema, safe=False))
+            os.replace(tmp_path, self.data_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
     def delete_files(self):
         """Supprimer les fichiers associés du disque"""
         try:
+            _evict_dataframe(self.data_path)
             if os.path.exists(self.data_path):
                 os.remove(self.data_path)
         except Exception as e:
@@ -98,89 +287,80 @@ class Dataset:
     
 class DatasetManager:
     """
-    Manages CRUD operations for datasets using local storage and JSON-based metadata.
+    Manages CRUD operations for datasets using local storage and SQLite-based metadata.
     """
 
     def __init__(self, storage_dir: str = "storage"):
         self.storage_dir = Path(storage_dir)
-        self.metadata_file = self.storage_dir / "datasets_metadata.json"
+        self.metadata_db = self.storage_dir / "meta.db"
         self.data_dir = self.storage_dir / "data"
 
         # Ensure required directories exist
         self.storage_dir.mkdir(exist_ok=True)
         self.data_dir.mkdir(exist_ok=True)
 
-        # Initialize metadata file if missing
-        if not self.metadata_file.exists():
-            self._save_metadata({})
+        # A single connection shared across requests, serialized by the lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.metadata_db, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS datasets (
+                id TEXT PRIMARY KEY,
+                filename TEXT,
+                file_size INTEGER,
+                upload_date TEXT,
+                data_path TEXT
+            )
+            """
+        )
+        self.conn.commit()
 
-    def _load_metadata(self) -> Dict:
-        """Load dataset metadata from JSON."""
-        try:
-            with open(self.metadata_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError as e:
-            logger.error(f"Metadata file is corrupted: {e}")
-            return {}
-        except FileNotFoundError:
-            logger.warning("Metadata file not found, initializing a new one.")
-            return {}
-
-    def _save_metadata(self, metadata: Dict):
-        """Save dataset metadata to JSON."""
-        with open(self.metadata_file, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
-        logger.info("Metadata updated successfully.")
-
-    def create_dataset(self, original_filename: str, file_size: int, df: pd.DataFrame) -> Dataset:
-        """Create and persist a new dataset."""
-        dataset_id = str(uuid.uuid4())
+    def new_dataset(self, original_filename: str, file_size: int) -> Dataset:
+        """Allocate a new dataset and its data path, without persisting anything."""
         dataset = Dataset(
-            id=dataset_id,
             filename=original_filename,
             file_size=file_size,
         )
-        dataset.data_path = str(self.data_dir / f"{dataset.id}.pkl")
-        dataset.save_dataframe(df)
-        metadata = self._load_metadata()
-        metadata[dataset.id] = dataset.to_dict()
-        self._save_metadata(metadata)
+        dataset.data_path = str(self.data_dir / f"{dataset.id}.parquet")
+        return dataset
+
+    def add_dataset(self, dataset: Dataset):
+        """Record a dataset whose data file has already been written."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO datasets (id, filename, file_size, upload_date, data_path) "
+                "VALUES (:id, :filename, :file_size, :upload_date, :data_path)",
+                dataset.to_dict(),
+            )
 
         logger.info(f"Dataset {dataset.id} created successfully.")
-        return dataset
 
     def get_dataset(self, dataset_id: str) -> Optional[Dataset]:
         """Retrieve a dataset using ID"""
-        metadata = self._load_metadata()
-        if dataset_id not in metadata:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM datasets WHERE id = ?", (dataset_id,)).fetchone()
+        if row is None:
             return None
-        
-        dataset_data = metadata[dataset_id]
-        dataset = Dataset.from_dict(dataset_data)
-        return dataset
+
+        return Dataset.from_dict(dict(row))
 
     def list_datasets(self) -> List[Dataset]:
         """Lister tous les datasets"""
-        metadata = self._load_metadata()
-        datasets = []
-        
-        for _, dataset_data in metadata.items():
-            dataset = Dataset.from_dict(dataset_data)
-            datasets.append(dataset)
-        
-        return datasets
+        with self._lock:
+            rows = self.conn.execute("SELECT * FROM datasets ORDER BY rowid").fetchall()
+
+        return [Dataset.from_dict(dict(row)) for row in rows]
     
 
     def delete_dataset(self, dataset_id: str) -> bool:
-        """Delete a dataset"""
-        dataset = self.get_dataset(dataset_id)
-        if not dataset:
-            return False
-        
-        dataset.delete_files()
-        metadata = self._load_metadata()
-        if dataset_id in metadata:
-            del metadata[dataset_id]
-            self._save_metadata(metadata)
-        
+        """Delete a dataset, returning False if it does not exist"""
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT * FROM datasets WHERE id = ?", (dataset_id,)).fetchone()
+            if row is None:
+                return False
+            self.conn.execute("DELETE FROM datasets WHERE id = ?", (dataset_id,))
+
+        Dataset.from_dict(dict(row)).delete_files()
         return True
\ No newline at end of file
@@ -1,6 +1,19 @@
 
 ALLOWED_EXTENSIONS = {'csv'}
+_ALLOWED_SUFFIXES = tuple(f".{ext}" for ext in ALLOWED_EXTENSIONS)
+# Types clients commonly send for .csv parts; octet-stream is what curl and most scripts default to
+ALLOWED_CONTENT_TYPES = {
+    'text/csv',
+    'application/csv',
+    'text/plain',
+    'application/vnd.ms-excel',
+    'application/octet-stream',
+}
 
 def allowed_file(filename: str) -> bool:
     """Verify the file extension"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
\ No newline at end of file
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
+
+def allowed_content_type(content_type: str) -> bool:
+    """Verify the declared content type of an uploaded file, if any"""
+    return not content_type or content_type.split(';', 1)[0].strip().lower() in ALLOWED_CONTENT_TYPES
\ No newline at end of file
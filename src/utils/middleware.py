@@ -0,0 +1,54 @@
+from fastapi.responses import ORJSONResponse
+
+
+class _BodyTooLarge(Exception):
+    """Raised from receive() once a request body passes the size limit"""
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject request bodies larger than max_bytes with a 413. The declared
+    Content-Length is checked before anything is read, and the bytes actually
+    received are counted as they arrive, so chunked uploads are cut off mid-transfer.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        too_large = ORJSONResponse(status_code=413, content={"detail": "Uploaded file is too large"})
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await too_large(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # Once the limit is hit, whatever error response the app builds is replaced by the 413
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            await too_large(scope, receive, send)
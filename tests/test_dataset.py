@@ -0,0 +1,177 @@
+import pandas as pd
+import pytest
+
+from services.dataset import CSV_BLOCK_SIZE, Dataset
+
+
+def _write_csv(path, rows):
+    path.write_text("\n".join(rows) + "\n")
+    return str(path)
+
+
+def test_save_csv_widens_columns_that_change_type_after_first_block(tmp_path):
+    n_rows = 120_000
+    rows = ["v,note,k"] + [f"{i},,{i}" for i in range(n_rows)] + ["1.5,hello,"]
+    csv_path = _write_csv(tmp_path / "late.csv", rows)
+    assert (tmp_path / "late.csv").stat().st_size > CSV_BLOCK_SIZE
+
+    dataset = Dataset(data_path=str(tmp_path / "data" / "late.parquet"))
+    dataset.save_csv(csv_path)
+    df = dataset.get_dataframe()
+
+    expected = pd.read_csv(csv_path)
+    assert len(df) == n_rows + 1
+    assert df["v"].iloc[-1] == 1.5
+    assert df["note"].iloc[-1] == "hello"
+    assert df["note"].isna().sum() == n_rows
+    assert df["v"].dtype.kind == "f"
+    assert df["k"].isna().sum() == 1
+    assert (df["v"].to_numpy() == expected["v"].to_numpy()).all()
+
+
+def test_save_csv_keeps_integer_columns_without_late_decimals(tmp_path):
+    csv_path = _write_csv(tmp_path / "ints.csv", ["a,b"] + [f"{i},x" for i in range(1000)])
+
+    dataset = Dataset(data_path=str(tmp_path / "ints.parquet"))
+    dataset.save_csv(csv_path)
+
+    assert dataset.get_dataframe()["a"].dtype.kind == "i"
+
+
+def test_write_excel_handles_timezones_and_infinities(tmp_path):
+    pytest.importorskip("openpyxl")
+    from routes.dataset_routes import _write_excel
+
+    csv_path = _write_csv(
+        tmp_path / "tz.csv",
+        ["ts,x", "2020-01-01T00:00:00Z,inf", "2020-01-02T00:00:00Z,-inf", ",1.5"],
+    )
+    dataset = Dataset(data_path=str(tmp_path / "tz.parquet"))
+    dataset.save_csv(csv_path)
+    excel_path = str(tmp_path / "tz.xlsx")
+
+    _write_excel(dataset, excel_path)
+
+    df = pd.read_excel(excel_path)
+    assert df["ts"].iloc[0] == pd.Timestamp("2020-01-01")
+    assert pd.isna(df["ts"].iloc[2])
+    assert df["x"].astype(float).tolist() == [float("inf"), float("-inf"), 1.5]
+
+
+def _multipart_chunks(filename, payload, boundary="limit-test", chunk_size=256):
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: text/csv\r\n\r\n"
+    ).encode() + payload + f"\r\n--{boundary}--\r\n".encode()
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    # A generator body is sent chunked, without a Content-Length header
+    return (body[start:start + chunk_size] for start in range(0, len(body), chunk_size)), headers
+
+
+def _limited_client(max_bytes):
+    from fastapi import FastAPI, File, UploadFile
+    from fastapi.testclient import TestClient
+    from utils.middleware import UploadSizeLimitMiddleware
+
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=max_bytes)
+
+    @app.post("/upload/")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+def test_chunked_upload_over_limit_is_rejected():
+    content, headers = _multipart_chunks("big.csv", b"a,b\n" + b"1,2\n" * 2000)
+
+    response = _limited_client(max_bytes=1000).post("/upload/", content=content, headers=headers)
+
+    assert response.status_code == 413
+
+
+def test_chunked_upload_under_limit_is_accepted():
+    payload = b"a,b\n" + b"1,2\n" * 10
+    content, headers = _multipart_chunks("small.csv", payload)
+
+    response = _limited_client(max_bytes=1000).post("/upload/", content=content, headers=headers)
+
+    assert response.status_code == 200
+    assert response.json() == {"size": len(payload)}
+
+
+def test_cors_middleware_wraps_upload_size_limit():
+    from fastapi.middleware.cors import CORSMiddleware
+    from app import app
+    from utils.middleware import UploadSizeLimitMiddleware
+
+    # user_middleware runs outermost first; CORS must see the 413 to add its headers
+    order = [middleware.cls for middleware in app.user_middleware]
+    assert order.index(CORSMiddleware) < order.index(UploadSizeLimitMiddleware)
+
+
+@pytest.fixture
+def api_client(tmp_path):
+    from fastapi.testclient import TestClient
+    from app import app
+    from deps import get_manager
+    from services.dataset import DatasetManager
+
+    # Override the cached manager so no test shares its storage with another
+    app.dependency_overrides[get_manager] = lambda: DatasetManager(str(tmp_path / "storage"))
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_upload_with_unsupported_content_type_is_rejected(api_client):
+    response = api_client.post("/dataset/datasets/", files={"file": ("d.csv", b"a\n1\n", "image/png")})
+
+    assert response.status_code == 400
+
+
+def test_float_values_survive_storage_and_excel_export(tmp_path):
+    csv_path = _write_csv(tmp_path / "prices.csv", ["price,ratio,half"] + ["19.99,0.370370367,0.5"] * 100)
+
+    dataset = Dataset(data_path=str(tmp_path / "prices.parquet"))
+    dataset.save_csv(csv_path)
+    df = dataset.get_dataframe()
+
+    assert (df["price"] == 19.99).all()
+    assert (df["ratio"] == 0.370370367).all()
+    assert (df["half"] == 0.5).all()
+
+    pytest.importorskip("openpyxl")
+    from routes.dataset_routes import _write_excel
+
+    excel_path = str(tmp_path / "prices.xlsx")
+    _write_excel(dataset, excel_path)
+    exported = pd.read_excel(excel_path)
+
+    assert exported["price"].tolist() == [19.99] * 100
+    assert exported["ratio"].tolist() == [0.370370367] * 100
+    assert exported["half"].tolist() == [0.5] * 100
+
+
+def test_process_pool_is_rebuilt_after_a_worker_dies(tmp_path):
+    import asyncio
+    import os
+    from concurrent.futures.process import BrokenProcessPool
+    from routes import dataset_routes
+
+    csv_path = _write_csv(tmp_path / "plot.csv", ["x,y"] + [f"{i},{i * 2}" for i in range(100)])
+    dataset = Dataset(data_path=str(tmp_path / "plot.parquet"), filename="plot.csv")
+    dataset.save_csv(csv_path)
+
+    async def run():
+        with pytest.raises(BrokenProcessPool):
+            await dataset_routes._run_in_process_pool(os._exit, 1)
+        return await dataset_routes._run_in_process_pool(dataset_routes._render_plot, dataset)
+
+    try:
+        content = asyncio.run(run())
+    finally:
+        dataset_routes.shutdown_process_pool()
+        dataset_routes._process_pool = None
+
+    assert content.startswith(b"%PDF")